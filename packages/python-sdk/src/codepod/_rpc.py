@@ -1,9 +1,144 @@
 import asyncio
+import binascii
+import errno
 import inspect
 import json
 import subprocess
 import threading
-from typing import Any, Callable
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, BinaryIO, Callable, Iterable
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see the ``fast`` extra
+    orjson = None
+
+
+# Frames are written straight into the pipe's buffered writer, which is the
+# reused send buffer.
+if orjson is not None:
+    _dumps = orjson.dumps
+
+    def _write_line(out: BinaryIO, obj: Any) -> None:
+        out.write(orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE))
+
+    _loads = orjson.loads
+else:
+    # Compact separators shrink every frame, and the circular-reference
+    # check is pointless for the plain dicts sent here.
+    _json_encode = json.JSONEncoder(check_circular=False, separators=(",", ":")).encode
+
+    def _dumps(obj: Any) -> bytes:
+        return _json_encode(obj).encode()
+
+    def _write_line(out: BinaryIO, obj: Any) -> None:
+        # Two buffered writes instead of copying the frame to append "\n".
+        out.write(_json_encode(obj).encode())
+        out.write(b"\n")
+
+    _loads = json.loads
+
+# Request frame with the fixed fields pre-serialized; only the method and
+# params are encoded per call, and no envelope dict is built.
+_ENVELOPE = b'{"jsonrpc":"2.0","id":%d,"method":%b,"params":%b}\n'
+
+
+def _encode_bytes(data: bytes) -> str:
+    """Encode a byte payload for transport inside a JSON-RPC message."""
+    return binascii.b2a_base64(data, newline=False).decode("ascii")
+
+
+def _decode_bytes(data: str) -> bytes:
+    """Decode a byte payload received inside a JSON-RPC message.
+
+    binascii accepts the ASCII ``str`` as-is, skipping the intermediate
+    ``bytes`` copy that ``base64.b64decode`` makes.
+    """
+    return binascii.a2b_base64(data)
+
+
+# Encoded characters per chunk in _decode_bytes_to (a multiple of 4, so
+# every chunk decodes on its own; yields just under 64 KiB per write).
+_DECODE_CHUNK = 87_380
+
+
+def _decode_bytes_to(data: str, sink: BinaryIO) -> int:
+    """Decode a byte payload straight into ``sink`` in bounded chunks.
+
+    Only one chunk of decoded output is alive at a time, instead of a second
+    full-size copy of the payload. Returns the number of bytes written.
+    """
+    written = 0
+    for start in range(0, len(data), _DECODE_CHUNK):
+        chunk = binascii.a2b_base64(data[start:start + _DECODE_CHUNK])
+        sink.write(chunk)
+        written += len(chunk)
+    return written
+
+
+# Raw bytes read per chunk in _write_base64 (a multiple of 3, so the
+# encoded chunks concatenate without inner padding).
+_ENCODE_CHUNK = 3 << 16
+
+
+def _upload_head(req_id: int, method: str, params: dict, field: str) -> bytes:
+    """A request frame up to the opening quote of its ``params[field]`` string."""
+    head = _dumps(params)[:-1]  # the params object minus its closing brace
+    if len(head) > 1:
+        head += b","
+    return b'{"jsonrpc":"2.0","id":%d,"method":%b,"params":%b%b:"' % (
+        req_id, _dumps(method), head, _dumps(field),
+    )
+
+
+def _write_base64(out: BinaryIO, source: BinaryIO, limit: int) -> bool:
+    """Write everything readable from ``source`` to ``out``, base64-encoded.
+
+    Reads are regrouped into multiples of 3 bytes, so a source that returns
+    short reads (a pipe, socket or unbuffered file) does not put padding in
+    the middle of the text. Stops early, returning False, once more than
+    ``limit`` encoded bytes have been written.
+    """
+    written = 0
+    carry = b""
+    while chunk := source.read(_ENCODE_CHUNK):
+        if carry:
+            chunk = carry + chunk
+        cut = len(chunk) - len(chunk) % 3
+        carry = chunk[cut:]
+        if cut:
+            encoded = binascii.b2a_base64(memoryview(chunk)[:cut], newline=False)
+            out.write(encoded)
+            written += len(encoded)
+            if written > limit:
+                return False
+    encoded = binascii.b2a_base64(carry, newline=False)
+    out.write(encoded)
+    return written + len(encoded) <= limit
+
+
+# Maximum number of unanswered requests call_batch keeps in flight, which
+# bounds how many payloads the server holds at once.
+_BATCH_WINDOW = 32
+
+# Longest request line (excluding the newline) either server accepts; the
+# SDK never overrides it through create's limits.rpcBytes. Longer lines are
+# answered with an error that carries no request id, so they are refused here
+# instead, where the caller is known.
+_MAX_FRAME = 8 << 20
+
+# Requested capacity for the stdio pipes (Linux only, best effort). The
+# default 64 KiB means a large files.write or export reply needs many
+# wakeups of the reader on the other side. The client's own buffered
+# stdin/stdout use the same size, so a large frame moves in a few syscalls
+# instead of hundreds of 8 KiB ones.
+_PIPE_SIZE = 1 << 20
 
 
 class RpcError(Exception):
@@ -11,6 +146,12 @@ class RpcError(Exception):
         super().__init__(message)
         self.code = code
         self.message = message
+        # Filesystem errors from either server start with the errno name
+        # ("ENOENT: ..."); expose it as a number, or None for other errors.
+        name = message.split(":", 1)[0]
+        self.errno: int | None = (
+            getattr(errno, name, None) if name[:1] == "E" and name.isupper() else None
+        )
 
 
 class RpcClient:
@@ -19,9 +160,33 @@ class RpcClient:
         self._server_args = server_args
         self._proc: subprocess.Popen | None = None
         self._next_id = 1
+        # Futures for requests written but not yet answered, resolved by the
+        # reader thread. _send_lock serializes id allocation and frame writes;
+        # _pending_lock alone guards _pending (and the output handlers that
+        # live and die with its entries), so the reader never waits on a
+        # writer that is blocked on a full pipe. _closed is set once the
+        # reader has failed every pending future and exited.
+        self._pending: dict[int, Future] = {}
+        self._closed = False
+        self._send_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._reader: threading.Thread | None = None
+        # Server callbacks run here so a slow handler does not hold up the
+        # reader, and handlers may themselves call back into the sandbox.
+        self._callback_pool: ThreadPoolExecutor | None = None
         self._extension_handlers: dict[str, Callable] = {}
+        # Names whose handler is a coroutine function, decided at registration.
+        self._async_extensions: set[str] = set()
         self._storage_handlers: dict[str, Callable] = {}
         self._output_handlers: dict[int | str, dict[str, Callable]] = {}
+        # One single-thread executor per request with output in flight, so its
+        # handlers run in order off the reader thread (and may call back into
+        # the sandbox) and its response is delivered after them. Only the
+        # reader thread touches this.
+        self._output_workers: dict[int, ThreadPoolExecutor] = {}
+        # Ids of frames written that the server will reject without an id,
+        # oldest first (guarded by _pending_lock).
+        self._unattributed: deque[int] = deque()
         # Persistent event loop for async extension handlers.
         # Created lazily on the first async handler registration.
         self._async_loop: asyncio.AbstractEventLoop | None = None
@@ -33,11 +198,30 @@ class RpcClient:
             stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
+            bufsize=_PIPE_SIZE,
         )
+        for pipe in (self._proc.stdin, self._proc.stdout):
+            _grow_pipe(pipe.fileno())  # type: ignore[union-attr]
+        self._callback_pool = ThreadPoolExecutor(thread_name_prefix="codepod-callback")
+        self._reader = threading.Thread(
+            target=self._read_loop,
+            args=(self._proc.stdout,),
+            daemon=True,
+            name="codepod-rpc-reader",
+        )
+        self._reader.start()
 
     def register_output_handler(
         self, request_id: int, on_stdout: Callable | None, on_stderr: Callable | None
     ) -> None:
+        """Route ``output`` notifications for ``request_id`` to the given handlers.
+
+        Handlers run on a worker thread of their own, in arrival order and
+        before the request's response is delivered, so they may call back
+        into the client. If one raises, the request fails with that exception.
+        Prefer passing them to :meth:`call`, which registers them under the
+        request's id atomically.
+        """
         handlers: dict[str, Callable] = {}
         if on_stdout:
             handlers["stdout"] = on_stdout
@@ -70,6 +254,9 @@ class RpcClient:
         """
         if inspect.iscoroutinefunction(handler):
             self._ensure_async_loop()
+            self._async_extensions.add(name)
+        else:
+            self._async_extensions.discard(name)
         self._extension_handlers[name] = handler
 
     def register_storage_handlers(self, save: "Callable | None", load: "Callable | None") -> None:
@@ -78,48 +265,228 @@ class RpcClient:
         if load:
             self._storage_handlers["storage.load"] = load
 
-    def call(self, method: str, params: dict | None = None) -> Any:
+    def call(
+        self,
+        method: str,
+        params: dict | None = None,
+        *,
+        on_stdout: Callable | None = None,
+        on_stderr: Callable | None = None,
+    ) -> Any:
+        """Send a request and wait for its result.
+
+        ``on_stdout``/``on_stderr`` receive the request's ``output``
+        notifications; they are registered under the request's own id before
+        it is written, and dropped once its response arrives.
+        """
+        self._require_started()
+        return self._send_request(
+            method, params, on_stdout=on_stdout, on_stderr=on_stderr,
+        ).result()
+
+    def call_with_upload(
+        self, method: str, params: dict | None, field: str, source: BinaryIO,
+    ) -> Any:
+        """Like :meth:`call`, with ``params[field]`` read from a binary file-like ``source``.
+
+        The payload is base64-encoded straight into the request as it is
+        read, so a large upload never has to be held in memory. Other
+        requests wait until the whole frame has been written. Raises
+        :class:`RpcError` as soon as the request outgrows what the server
+        accepts.
+        """
+        self._require_started()
+        return self._send_request(method, params, upload=(field, source)).result()
+
+    def call_async(self, method: str, params: dict | None = None) -> Future:
+        """Send a request and return a future for its result without waiting.
+
+        Several requests can be outstanding on the connection at once; the
+        future's ``result()`` returns what :meth:`call` would, or raises its
+        :class:`RpcError`. The server may handle outstanding requests in any
+        order, so only issue calls together that do not depend on each other.
+        """
+        self._require_started()
+        return self._send_request(method, params)
+
+    def call_batch(self, calls: "Iterable[tuple[str, dict | None]]") -> list[Any]:
+        """Issue several requests back to back and return their results in order.
+
+        ``calls`` may be a lazy iterable; each request is encoded and written
+        as it is produced, while earlier ones are already being served.
+        Requests are pipelined over the stdio connection instead of waiting
+        for each response in turn; the reader thread matches them back up by
+        id. At most ``_BATCH_WINDOW`` requests are left unanswered at a time.
+        All responses are collected before the first failing call (in request
+        order) raises its :class:`RpcError`.
+        """
+        self._require_started()
+        futures: list[Future] = []
+        done = 0
+        try:
+            for method, params in calls:
+                if len(futures) - done >= _BATCH_WINDOW:
+                    self._flush()
+                    wait((futures[done],))
+                    done += 1
+                futures.append(self._send_request(method, params, flush=False))
+        except BaseException:
+            # Nobody will collect these results: stop tracking them, so their
+            # late responses are dropped.
+            abandoned = set(futures)
+            with self._pending_lock:
+                for req_id in [i for i, f in self._pending.items() if f in abandoned]:
+                    del self._pending[req_id]
+            raise
+        finally:
+            # Send what was written now, not with the next unrelated call.
+            self._flush()
+        wait(futures)
+        return [f.result() for f in futures]
+
+    def _require_started(self) -> None:
         if self._proc is None or self._proc.stdin is None or self._proc.stdout is None:
             raise RuntimeError("RPC client not started")
-        req_id = self._next_id
-        self._next_id += 1
-        request = {"jsonrpc": "2.0", "id": req_id, "method": method, "params": params or {}}
-        line = json.dumps(request) + "\n"
-        self._proc.stdin.write(line.encode())
-        self._proc.stdin.flush()
-
-        # Read responses, handling interleaved callback requests from the server
-        while True:
-            resp_line = self._proc.stdout.readline()
-            if not resp_line:
-                raise RuntimeError("Server closed connection")
-            msg = json.loads(resp_line)
-
-            # Output streaming notification (no id, method = "output")
-            if "method" in msg and msg["method"] == "output" and "id" not in msg:
-                params = msg.get("params", {})
-                rid = params.get("request_id")
-                handlers = self._output_handlers.get(rid, {})
-                stream_type = params.get("stream")
-                data = params.get("data", "")
-                handler = handlers.get(stream_type)
-                if handler:
-                    handler(data)
-                continue
-
-            # Callback request from server? (id starts with 'cb_' and has a method)
-            if (
-                "method" in msg
-                and isinstance(msg.get("id"), str)
-                and msg["id"].startswith("cb_")
-            ):
-                self._handle_callback(msg)
-                continue
-
-            # Normal response to our request
-            if "error" in msg and msg["error"]:
-                raise RpcError(msg["error"]["code"], msg["error"]["message"])
-            return msg.get("result")
+
+    def _send_request(
+        self,
+        method: str,
+        params: dict | None,
+        *,
+        flush: bool = True,
+        on_stdout: Callable | None = None,
+        on_stderr: Callable | None = None,
+        upload: "tuple[str, BinaryIO] | None" = None,
+    ) -> Future:
+        """Write one request frame and return a future for its result."""
+        future: Future = Future()
+        with self._send_lock:
+            req_id = self._next_id
+            self._next_id += 1
+            if upload is None:
+                frame = _ENVELOPE % (req_id, _dumps(method), _dumps(params or {}))
+                if len(frame) > _MAX_FRAME + 1:
+                    raise RpcError(-32700, "Request too large")
+            else:
+                field, source = upload
+                frame = _upload_head(req_id, method, params or {}, field)
+            # Registered before writing so the reader can never miss it.
+            with self._pending_lock:
+                if self._closed:
+                    raise RuntimeError("Server closed connection")
+                self._pending[req_id] = future
+                self.register_output_handler(req_id, on_stdout, on_stderr)
+            self._proc.stdin.write(frame)  # type: ignore[union-attr]
+            if upload is not None:
+                try:
+                    fits = _write_base64(self._proc.stdin, source, _MAX_FRAME - len(frame) - 3)  # type: ignore[arg-type]
+                except BaseException:
+                    self._abort_frame(req_id)
+                    raise
+                if not fits:
+                    self._abort_frame(req_id)
+                    raise RpcError(-32700, "Request too large")
+                self._proc.stdin.write(b'"}}\n')  # type: ignore[union-attr]
+            if flush:
+                self._proc.stdin.flush()  # type: ignore[union-attr]
+        return future
+
+    def _abort_frame(self, req_id: int) -> None:
+        """End a partly written frame so the server rejects it (callers hold ``_send_lock``).
+
+        The line is left an unterminated string, so the server never acts on
+        a truncated payload; it answers with an error that carries no id. The
+        request's future stays pending as a placeholder for that error, so it
+        is dropped there instead of being charged to another request.
+        """
+        with self._pending_lock:
+            self._unattributed.append(req_id)
+            self._output_handlers.pop(req_id, None)
+        self._proc.stdin.write(b"\n")  # type: ignore[union-attr]
+        self._proc.stdin.flush()  # type: ignore[union-attr]
+
+    def _flush(self) -> None:
+        with self._send_lock:
+            self._proc.stdin.flush()  # type: ignore[union-attr]
+
+    def _write_frame(self, msg: dict) -> None:
+        """Write one newline-terminated message (callers hold ``_send_lock``)."""
+        _write_line(self._proc.stdin, msg)  # type: ignore[arg-type]
+
+    def _read_loop(self, stdout: BinaryIO) -> None:
+        """Reader thread: route every message from the server until EOF.
+
+        Responses resolve the matching pending future, output notifications
+        go to their request's output worker, and callback requests are
+        dispatched to the callback pool.
+        """
+        try:
+            for resp_line in iter(stdout.readline, b""):
+                msg = _loads(resp_line)
+
+                # Only server-initiated messages carry a method; responses never do.
+                method = msg.get("method")
+                if method is not None:
+                    if "id" in msg:
+                        # Callback request from server
+                        self._callback_pool.submit(self._handle_callback, msg)  # type: ignore[union-attr]
+                    elif method == "output":
+                        # Output streaming notification
+                        params = msg.get("params", {})
+                        rid = params.get("request_id")
+                        with self._pending_lock:
+                            handler = self._output_handlers.get(rid, {}).get(params.get("stream"))
+                            future = self._pending.get(rid)
+                        if handler and future is not None:
+                            worker = self._output_workers.get(rid)
+                            if worker is None:
+                                worker = self._output_workers[rid] = ThreadPoolExecutor(
+                                    max_workers=1, thread_name_prefix="codepod-output",
+                                )
+                            worker.submit(_emit_output, future, handler, params.get("data", ""))
+                    continue
+
+                rid = msg.get("id")
+                with self._pending_lock:
+                    if rid not in self._pending and not rid and "error" in msg:
+                        # The server could not tie this error to a request and
+                        # replied with id 0 or null. Frames known to draw such
+                        # a reply are queued in _unattributed; past those, the
+                        # oldest request is the only candidate on a server
+                        # that dispatches serially.
+                        if self._unattributed:
+                            rid = self._unattributed.popleft()
+                        elif self._pending:
+                            rid = min(self._pending)
+                    future = self._pending.pop(rid, None)
+                    self._output_handlers.pop(rid, None)
+                worker = self._output_workers.pop(rid, None)
+                if worker is None:
+                    if future is not None:
+                        _resolve(future, msg)
+                else:
+                    # Delivered after the handlers already queued for it.
+                    if future is not None:
+                        worker.submit(_resolve, future, msg)
+                    worker.shutdown(wait=False)
+        except Exception as e:
+            error: Exception = e
+        else:
+            error = RuntimeError("Server closed connection")
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._closed = True
+            self._output_handlers.clear()
+            self._unattributed.clear()
+        workers, self._output_workers = self._output_workers, {}
+        for rid, future in pending.items():
+            worker = workers.get(rid)
+            if worker is None:
+                _fail(future, error)
+            else:
+                worker.submit(_fail, future, error)
+        for worker in workers.values():
+            worker.shutdown(wait=False)
 
     def _handle_callback(self, msg: dict) -> None:
         """Handle a callback request from the server and send back the response."""
@@ -140,7 +507,7 @@ class RpcClient:
                     env=params.get("env", {}),
                     cwd=params.get("cwd", "/"),
                 )
-                if inspect.iscoroutinefunction(handler):
+                if name in self._async_extensions:
                     assert self._async_loop is not None
                     future = asyncio.run_coroutine_threadsafe(
                         handler(**kwargs), self._async_loop,
@@ -155,16 +522,14 @@ class RpcClient:
                     self._send_callback_error(cb_id, f"No handler for: {method}")
                     return
                 if method == "storage.save":
-                    import base64
-                    state = base64.b64decode(params.get("state", ""))
+                    state = _decode_bytes(params.get("state", ""))
                     sandbox_id = params.get("sandbox_id", "")
                     handler(sandbox_id, state)
                     self._send_callback_result(cb_id, None)
                 elif method == "storage.load":
-                    import base64
                     sandbox_id = params.get("sandbox_id", "")
                     result = handler(sandbox_id)
-                    data = base64.b64encode(result).decode("ascii")
+                    data = _encode_bytes(result)
                     self._send_callback_result(cb_id, data)
             else:
                 self._send_callback_error(cb_id, f"Unknown callback method: {method}")
@@ -172,16 +537,14 @@ class RpcClient:
             self._send_callback_error(cb_id, str(e))
 
     def _send_callback_result(self, cb_id: str, result: Any) -> None:
-        resp = {"jsonrpc": "2.0", "id": cb_id, "result": result}
-        line = json.dumps(resp) + "\n"
-        self._proc.stdin.write(line.encode())  # type: ignore[union-attr]
-        self._proc.stdin.flush()  # type: ignore[union-attr]
+        with self._send_lock:
+            self._write_frame({"jsonrpc": "2.0", "id": cb_id, "result": result})
+            self._proc.stdin.flush()  # type: ignore[union-attr]
 
     def _send_callback_error(self, cb_id: str, message: str) -> None:
-        resp = {"jsonrpc": "2.0", "id": cb_id, "error": {"code": -32603, "message": message}}
-        line = json.dumps(resp) + "\n"
-        self._proc.stdin.write(line.encode())  # type: ignore[union-attr]
-        self._proc.stdin.flush()  # type: ignore[union-attr]
+        with self._send_lock:
+            self._write_frame({"jsonrpc": "2.0", "id": cb_id, "error": {"code": -32603, "message": message}})
+            self._proc.stdin.flush()  # type: ignore[union-attr]
 
     def stop(self) -> None:
         if self._async_loop is not None:
@@ -198,3 +561,48 @@ class RpcClient:
             except subprocess.TimeoutExpired:
                 proc.kill()
                 proc.wait()
+        if self._reader is not None:
+            # The server is gone, so the reader sees EOF and exits.
+            self._reader.join(timeout=2)
+            self._reader = None
+        if self._callback_pool is not None:
+            self._callback_pool.shutdown(wait=False)
+            self._callback_pool = None
+
+
+def _resolve(future: Future, msg: dict) -> None:
+    """Complete a request's future from its response message."""
+    if future.done():
+        # An output handler of the request raised first.
+        return
+    error = msg.get("error")
+    if error:
+        future.set_exception(RpcError(error["code"], error["message"]))
+    else:
+        future.set_result(msg.get("result"))
+
+
+def _fail(future: Future, error: BaseException) -> None:
+    if not future.done():
+        future.set_exception(error)
+
+
+def _emit_output(future: Future, handler: Callable, data: str) -> None:
+    """Pass one chunk of output to a handler; if it raises, fail its request."""
+    if future.done():
+        return
+    try:
+        handler(data)
+    except Exception as e:
+        future.set_exception(e)
+
+
+def _grow_pipe(fd: int) -> None:
+    """Enlarge a pipe's kernel buffer to ``_PIPE_SIZE`` where supported."""
+    if fcntl is None or not hasattr(fcntl, "F_SETPIPE_SZ"):
+        return
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, _PIPE_SIZE)
+    except OSError:
+        # Over the per-user pipe quota or not a pipe; keep the default size.
+        pass
@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class CommandResult:
     stdout: str
     stderr: str
@@ -11,7 +11,7 @@ class CommandResult:
     error_class: str | None = None
 
 
-@dataclass
+@dataclass(slots=True)
 class FileInfo:
     name: str
     type: str  # "file" or "dir"
@@ -5,9 +5,16 @@ from codepod._types import CommandResult
 
 
 class Commands:
-    def __init__(self, client: RpcClient, sandbox_id: str | None = None):
+    def __init__(
+        self,
+        client: RpcClient,
+        sandbox_id: str | None = None,
+        on_mutate: "Callable[[], None] | None" = None,
+    ):
         self._client = client
         self._sandbox_id = sandbox_id
+        # Called before every run, since any command may change state.
+        self._on_mutate = on_mutate
 
     def run(
         self,
@@ -23,22 +30,22 @@ class Commands:
         if stream:
             params["stream"] = True
 
-        # Register output handlers before the RPC call
-        req_id = self._client._next_id  # peek at the next request ID
-        if stream and (on_stdout or on_stderr):
-            self._client.register_output_handler(req_id, on_stdout, on_stderr)
+        if self._on_mutate is not None:
+            self._on_mutate()
 
-        try:
+        if stream:
+            result = self._client.call("run", params, on_stdout=on_stdout, on_stderr=on_stderr)
+        else:
             result = self._client.call("run", params)
-        finally:
-            if stream:
-                self._client.unregister_output_handler(req_id)
 
+        # Positional construction: this runs once per command, and keyword
+        # binding in the generated __init__ is measurably slower.
+        get = result.get
         return CommandResult(
-            stdout=result["stdout"],
-            stderr=result["stderr"],
-            exit_code=result["exitCode"],
-            execution_time_ms=result["executionTimeMs"],
-            truncated=result.get("truncated"),
-            error_class=result.get("errorClass"),
+            result["stdout"],
+            result["stderr"],
+            result["exitCode"],
+            result["executionTimeMs"],
+            get("truncated"),
+            get("errorClass"),
         )
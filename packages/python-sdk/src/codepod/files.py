@@ -1,12 +1,43 @@
-import base64
-from codepod._rpc import RpcClient
+import posixpath
+from typing import Callable
+
+from codepod._rpc import RpcClient, _decode_bytes, _encode_bytes
 from codepod._types import FileInfo
 
 
 class Files:
-    def __init__(self, client: RpcClient, sandbox_id: str | None = None):
+    def __init__(
+        self,
+        client: RpcClient,
+        sandbox_id: str | None = None,
+        on_mutate: "Callable[[], None] | None" = None,
+    ):
         self._client = client
         self._sandbox_id = sandbox_id
+        # Called before any request that may change sandbox state.
+        self._on_mutate = on_mutate
+        # Sizes of files mounted from the host, by normalized absolute path,
+        # so stat() on them needs no round trip. Dropped on any state change.
+        self._mounted: dict[str, int] = {}
+
+    def _mutating(self) -> None:
+        self._mounted.clear()
+        if self._on_mutate is not None:
+            self._on_mutate()
+
+    def _cache_mount(self, path: str, flat: dict[str, bytes]) -> None:
+        """Record the sizes of the files just mounted at ``path``.
+
+        Keys are split as the servers split them, dropping empty and ``.``
+        segments (so a leading ``/`` stays under the mount point). Keys with
+        a ``..`` segment are left out: the servers do not agree on where
+        those files end up.
+        """
+        root = posixpath.normpath(path)
+        for rel, data in flat.items():
+            parts = [part for part in rel.split("/") if part and part != "."]
+            if parts and ".." not in parts:
+                self._mounted[posixpath.join(root, *parts)] = len(data)
 
     def _params(self, **kwargs) -> dict:
         if self._sandbox_id is not None:
@@ -15,24 +46,57 @@ class Files:
 
     def read(self, path: str) -> bytes:
         result = self._client.call("files.read", self._params(path=path))
-        return base64.b64decode(result["data"])
+        return _decode_bytes(result["data"])
 
     def write(self, path: str, data: bytes | str) -> None:
-        if isinstance(data, str):
-            data = data.encode("utf-8")
-        encoded = base64.b64encode(data).decode("ascii")
+        encoded = _encode_bytes(data if type(data) is bytes else _to_bytes(data))
+        self._mutating()
         self._client.call("files.write", self._params(path=path, data=encoded))
 
+    def write_many(self, files: dict[str, bytes | str]) -> None:
+        """Write several files, pipelining the ``files.write`` requests.
+
+        Payloads are encoded lazily as the batch is sent, so encoding the
+        next file overlaps with the server handling the previous one and
+        only one encoded payload is held at a time.
+        """
+        self._mutating()
+        self._client.call_batch(
+            (
+                "files.write",
+                self._params(
+                    path=path,
+                    data=_encode_bytes(data if type(data) is bytes else _to_bytes(data)),
+                ),
+            )
+            for path, data in files.items()
+        )
+
     def list(self, path: str) -> list[FileInfo]:
         result = self._client.call("files.list", self._params(path=path))
         return [FileInfo(name=e["name"], type=e["type"], size=e["size"]) for e in result["entries"]]
 
     def mkdir(self, path: str) -> None:
+        self._mutating()
         self._client.call("files.mkdir", self._params(path=path))
 
     def rm(self, path: str) -> None:
+        self._mutating()
         self._client.call("files.rm", self._params(path=path))
 
     def stat(self, path: str) -> FileInfo:
+        if self._mounted:
+            normalized = posixpath.normpath(path)
+            size = self._mounted.get(normalized)
+            if size is not None:
+                return FileInfo(posixpath.basename(normalized), "file", size)
         result = self._client.call("files.stat", self._params(path=path))
         return FileInfo(name=result["name"], type=result["type"], size=result["size"])
+
+
+def _to_bytes(data: bytes | str) -> bytes:
+    # Callers on hot paths test ``type(data) is bytes`` first and only fall
+    # back to this for other types.
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    return data
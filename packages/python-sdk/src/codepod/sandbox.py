@@ -1,25 +1,66 @@
 from __future__ import annotations
 
-import base64
 import os
 import shutil
-from typing import Callable
-from codepod._rpc import RpcClient
+from functools import lru_cache, wraps
+from typing import BinaryIO, Callable
+from codepod._rpc import RpcClient, _decode_bytes, _decode_bytes_to, _encode_bytes
 from codepod.commands import Commands
 from codepod.extension import Extension, _make_extensions_command
-from codepod.files import Files
+from codepod.files import Files, _to_bytes
 from codepod.sandbox_manager import SandboxManager
-from codepod.vfs import VirtualFileSystem, _encode_files_for_rpc
+from codepod.vfs import MemoryFS, VirtualFileSystem, _encode_files_for_rpc
 
 _PKG_DIR = os.path.dirname(os.path.abspath(__file__))
 _BUNDLED_DIR = os.path.join(_PKG_DIR, "_bundled")
-
-
+_REPO_ROOT = os.path.abspath(os.path.join(_PKG_DIR, "..", "..", "..", ".."))
+
+# (server_args, wasm_dir, shell_wasm) for the deno engine, computed once at
+# import so creating a sandbox does no path joining.
+_BUNDLED_WASM_DIR = os.path.join(_BUNDLED_DIR, "wasm")
+_BUNDLED_DENO = (
+    (os.path.join(_BUNDLED_DIR, "server.js"),),
+    _BUNDLED_WASM_DIR,
+    os.path.join(_BUNDLED_WASM_DIR, "codepod-shell-exec.wasm"),
+)
+_DEV_WASM_DIR = os.path.join(
+    _REPO_ROOT, "packages", "orchestrator", "src", "platform", "__tests__", "fixtures"
+)
+_DEV_DENO = (
+    (
+        "run", "-A", "--no-check", "--unstable-sloppy-imports",
+        os.path.join(_REPO_ROOT, "packages", "sdk-server", "src", "server.ts"),
+    ),
+    _DEV_WASM_DIR,
+    os.path.join(_DEV_WASM_DIR, "codepod-shell-exec.wasm"),
+)
+
+
+@lru_cache(maxsize=None)
 def _is_bundled() -> bool:
     """Check if we're running from an installed wheel with bundled assets."""
     return os.path.isdir(_BUNDLED_DIR)
 
 
+def _cache_found(find: Callable[[], str | None]) -> Callable[[], str | None]:
+    """Memoize a binary lookup once it succeeds.
+
+    A miss is not remembered, so a binary installed after a failed
+    ``Sandbox()`` is found by the next one.
+    """
+    found: str | None = None
+
+    @wraps(find)
+    def lookup() -> str | None:
+        nonlocal found
+        if found is None:
+            found = find()
+        return found
+
+    return lookup
+
+
+@_cache_found
 def _find_codepod_server() -> str | None:
     """Find codepod-server binary: adjacent to wheel, then on PATH."""
     adjacent = os.path.join(_PKG_DIR, "codepod-server")
@@ -28,6 +69,7 @@ def _find_codepod_server() -> str | None:
     return shutil.which("codepod-server")
 
 
+@_cache_found
 def _find_deno() -> str | None:
     """Find the deno binary."""
     if _is_bundled():
@@ -60,49 +102,8 @@ def _resolve_runtime(engine: str) -> tuple[str, list[str], str | None, str | Non
     deno = _find_deno()
     if deno is None:
         raise RuntimeError("Neither codepod-server nor deno found on PATH.")
-    if _is_bundled():
-        server = os.path.join(_BUNDLED_DIR, "server.js")
-        wasm_dir = os.path.join(_BUNDLED_DIR, "wasm")
-        shell_wasm = os.path.join(wasm_dir, "codepod-shell-exec.wasm")
-        return deno, [server], wasm_dir, shell_wasm
-    else:
-        repo_root = os.path.abspath(os.path.join(_PKG_DIR, "..", "..", "..", ".."))
-        server = os.path.join(repo_root, "packages", "sdk-server", "src", "server.ts")
-        server_args = ["run", "-A", "--no-check", "--unstable-sloppy-imports", server]
-        wasm_dir = os.path.join(
-            repo_root, "packages", "orchestrator", "src", "platform", "__tests__", "fixtures"
-        )
-        shell_wasm = os.path.join(wasm_dir, "codepod-shell-exec.wasm")
-        return deno, server_args, wasm_dir, shell_wasm
-
-
-def _bundled_paths() -> tuple[str, list[str], str, str]:
-    """Return (runtime, server_args, wasm_dir, shell_wasm) for installed mode."""
-    runtime = os.path.join(_BUNDLED_DIR, "deno")
-    server = os.path.join(_BUNDLED_DIR, "server.js")
-    server_args = [server]
-    wasm_dir = os.path.join(_BUNDLED_DIR, "wasm")
-    shell_wasm = os.path.join(wasm_dir, "codepod-shell-exec.wasm")
-    return runtime, server_args, wasm_dir, shell_wasm
-
-
-def _dev_paths() -> tuple[str, list[str], str, str]:
-    """Return (runtime, server_args, wasm_dir, shell_wasm) for dev mode."""
-    runtime_path = shutil.which("deno")
-    if runtime_path is None:
-        raise RuntimeError("Deno not found on PATH (required for dev mode)")
-
-    repo_root = os.path.abspath(os.path.join(_PKG_DIR, "..", "..", "..", ".."))
-    server = os.path.join(repo_root, "packages", "sdk-server", "src", "server.ts")
-    server_args = ["run", "-A", "--no-check", "--unstable-sloppy-imports", server]
-    wasm_dir = os.path.join(
-        repo_root, "packages", "orchestrator", "src", "platform", "__tests__", "fixtures"
-    )
-    shell_wasm = os.path.join(
-        repo_root, "packages", "orchestrator", "src", "platform", "__tests__", "fixtures",
-        "codepod-shell-exec.wasm",
-    )
-    return runtime_path, server_args, wasm_dir, shell_wasm
+    server_args, wasm_dir, shell_wasm = _BUNDLED_DENO if _is_bundled() else _DEV_DENO
+    return deno, list(server_args), wasm_dir, shell_wasm
 
 
 MountSpec = dict[str, bytes | str]
@@ -138,13 +139,18 @@ class Sandbox:
         _sandbox_id: str | None = None,
         _client: RpcClient | None = None,
     ):
+        # Snapshot coalescing: snapshot() reuses the last id while no call
+        # that could change state has been made since it was taken.
+        self._dirty = True
+        self._last_snapshot_id: str | None = None
+
         if _client is not None:
             # Internal constructor for forked sandboxes
             self._client = _client
             self._sandbox_id = _sandbox_id
             self._engine = 'deno'  # forks don't support CPU control
-            self.commands = Commands(self._client, self._sandbox_id)
-            self.files = Files(self._client, self._sandbox_id)
+            self.commands = Commands(self._client, self._sandbox_id, self._mark_dirty)
+            self.files = Files(self._client, self._sandbox_id, self._mark_dirty)
             self.sandboxes = SandboxManager(self._client)
             return
 
@@ -171,9 +177,10 @@ class Sandbox:
             create_params["shellWasmPath"] = shell_wasm
 
         # Encode mounts for create-time mounting
-        if mounts:
+        mounted = [(path, files, _extract_flat_files(files)) for path, files in mounts or ()]
+        if mounted:
             create_params["mounts"] = [
-                _serialize_mount(path, files) for path, files in mounts
+                _serialize_mount(path, files, flat) for path, files, flat in mounted
             ]
 
         if storage:
@@ -226,9 +233,15 @@ class Sandbox:
 
         self._client.call("create", create_params)
 
-        self.commands = Commands(self._client)
-        self.files = Files(self._client)
+        self.commands = Commands(self._client, on_mutate=self._mark_dirty)
+        self.files = Files(self._client, on_mutate=self._mark_dirty)
         self.sandboxes = SandboxManager(self._client)
+        for path, _files, flat in mounted:
+            self.files._cache_mount(path, flat)
+
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        self.files._mounted.clear()
 
     def _with_id(self, params: dict) -> dict:
         if self._sandbox_id is not None:
@@ -255,8 +268,25 @@ class Sandbox:
             sb.mount("/mnt/pkg", fs)
         """
         flat = _extract_flat_files(files)
-        encoded = _encode_files_for_rpc(flat)
-        self._client.call("mount", self._with_id({"path": path, "files": encoded}))
+        params = self._with_id(_serialize_mount(path, files, flat))
+        self._mark_dirty()
+        self._client.call("mount", params)
+        self.files._cache_mount(path, flat)
+
+    def mount_many(self, mounts: list[tuple[str, MountSpec | VirtualFileSystem]]) -> None:
+        """Mount several file sets, pipelining the ``mount`` requests.
+
+        Args:
+            mounts: ``(path, files)`` tuples, as accepted by :meth:`mount`.
+        """
+        self._mark_dirty()
+        flats = [(path, files, _extract_flat_files(files)) for path, files in mounts]
+        self._client.call_batch(
+            ("mount", self._with_id(_serialize_mount(path, files, flat)))
+            for path, files, flat in flats
+        )
+        for path, _files, flat in flats:
+            self.files._cache_mount(path, flat)
 
     def suspend(self) -> None:
         """Pause the sandbox before the next run() call (wasmtime only).
@@ -284,31 +314,64 @@ class Sandbox:
             )
         self._client.call("sandbox.resume", self._with_id({}))
 
-    def snapshot(self) -> str:
-        """Save current VFS + env state. Returns snapshot ID."""
+    def snapshot(self, *, force: bool = False) -> str:
+        """Save current VFS + env state. Returns snapshot ID.
+
+        If nothing that could change state (a command, file write/mkdir/rm,
+        mount, import or restore) has happened since the last snapshot or
+        restore, that snapshot's ID is returned without a server round trip.
+        Pass ``force=True`` to always take a new snapshot.
+        """
+        if not force and not self._dirty and self._last_snapshot_id is not None:
+            return self._last_snapshot_id
         result = self._client.call("snapshot.create", self._with_id({}))
+        self._last_snapshot_id = result["id"]
+        self._dirty = False
         return result["id"]
 
     def restore(self, snapshot_id: str) -> None:
         """Restore to a previous snapshot."""
+        self._mark_dirty()
         self._client.call("snapshot.restore", self._with_id({"id": snapshot_id}))
+        self._last_snapshot_id = snapshot_id
+        self._dirty = False
+
+    def export_state(self, sink: BinaryIO | None = None) -> bytes | None:
+        """Export the full sandbox state (VFS + env) as an opaque blob.
 
-    def export_state(self) -> bytes:
-        """Export the full sandbox state (VFS + env) as an opaque blob."""
+        Args:
+            sink: Optional binary file-like object. When given, the blob is
+                decoded into it chunk by chunk and ``None`` is returned, so a
+                large state never has to be held in memory as ``bytes``.
+        """
         result = self._client.call("persistence.export", self._with_id({}))
-        return base64.b64decode(result["data"])
+        if sink is not None:
+            _decode_bytes_to(result.pop("data"), sink)
+            return None
+        return _decode_bytes(result["data"])
 
-    def import_state(self, blob: bytes) -> None:
-        """Import a previously exported sandbox state, replacing current state."""
-        data = base64.b64encode(blob).decode("ascii")
-        self._client.call("persistence.import", self._with_id({"data": data}))
+    def import_state(self, blob: bytes | BinaryIO) -> None:
+        """Import a previously exported sandbox state, replacing current state.
+
+        Args:
+            blob: The exported state, either as ``bytes`` or as a binary
+                file-like object. A file is encoded into the request as it
+                is read, so the state never has to be held in memory.
+        """
+        self._mark_dirty()
+        if isinstance(blob, (bytes, bytearray, memoryview)):
+            self._client.call("persistence.import", self._with_id({"data": _encode_bytes(blob)}))
+        else:
+            self._client.call_with_upload("persistence.import", self._with_id({}), "data", blob)
 
     def offload(self) -> None:
         """Offload sandbox state to external storage, freeing memory."""
+        self._mark_dirty()
         self._client.call("offload", self._with_id({}))
 
     def rehydrate(self) -> None:
         """Restore sandbox state from external storage."""
+        self._mark_dirty()
         self._client.call("rehydrate", self._with_id({}))
 
     def fork(self) -> "Sandbox":
@@ -349,16 +412,13 @@ def _extract_flat_files(files: MountSpec | VirtualFileSystem) -> dict[str, bytes
     """Convert a mount spec or VFS to a flat {path: bytes} dict."""
     if isinstance(files, VirtualFileSystem):
         return files._to_flat_files()
-    result: dict[str, bytes] = {}
-    for k, v in files.items():
-        if isinstance(v, str):
-            v = v.encode("utf-8")
-        result[k] = v
-    return result
-
-
-def _serialize_mount(path: str, files: MountSpec | VirtualFileSystem) -> dict:
-    """Serialize a mount for the create RPC."""
-    flat = _extract_flat_files(files)
-    encoded = _encode_files_for_rpc(flat)
-    return {"path": path, "files": encoded}
+    return {k: v if type(v) is bytes else _to_bytes(v) for k, v in files.items()}
+
+
+def _serialize_mount(
+    path: str, files: MountSpec | VirtualFileSystem, flat: dict[str, bytes]
+) -> dict:
+    """Serialize a mount (and its flattened files) for the create and mount RPCs."""
+    if isinstance(files, MemoryFS):
+        return {"path": path, "files": files._to_encoded_files()}
+    return {"path": path, "files": _encode_files_for_rpc(flat)}
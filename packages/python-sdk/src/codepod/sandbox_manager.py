@@ -4,7 +4,7 @@ from codepod.commands import Commands
 from codepod.files import Files
 
 
-@dataclass
+@dataclass(slots=True)
 class SandboxInfo:
     sandbox_id: str
     label: str | None = None
@@ -20,19 +20,22 @@ Usage::
 
 from __future__ import annotations
 
-import base64
+import binascii
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from functools import lru_cache
 
+from codepod.files import _to_bytes
 
-@dataclass
+
+@dataclass(slots=True)
 class FileStat:
     """File or directory metadata."""
     type: str  # "file" or "dir"
     size: int
 
 
-@dataclass
+@dataclass(slots=True)
 class DirEntry:
     """A single entry in a directory listing."""
     name: str
@@ -108,12 +111,19 @@ class MemoryFS(VirtualFileSystem):
 
     def __init__(self, files: dict[str, bytes | str] | None = None, *, writable: bool = False):
         self._files: dict[str, bytes] = {}
+        # Directory index: dir path ("" is the root) -> {child name: type}.
+        # Built alongside _files so readdir never scans the flat dict.
+        self._children: dict[str, dict[str, str]] = {"": {}}
         self._writable = writable
+        # Base64 form of _files for mount RPCs, reused until the next write.
+        self._encoded: dict[str, str] | None = None
         if files:
-            for path, data in files.items():
-                if isinstance(data, str):
-                    data = data.encode("utf-8")
-                self._files[_normalize(path)] = data
+            self._files = {
+                _normalize(path): data if type(data) is bytes else _to_bytes(data)
+                for path, data in files.items()
+            }
+            for path in self._files:
+                self._index(path)
 
     def read_file(self, path: str) -> bytes:
         path = _normalize(path)
@@ -128,9 +138,11 @@ class MemoryFS(VirtualFileSystem):
         if not self._writable:
             raise PermissionError("read-only filesystem")
         path = _normalize(path)
-        if isinstance(data, str):
-            data = data.encode("utf-8")
+        if type(data) is not bytes:
+            data = _to_bytes(data)
         self._files[path] = data
+        self._encoded = None
+        self._index(path)
 
     def exists(self, path: str) -> bool:
         path = _normalize(path)
@@ -142,52 +154,74 @@ class MemoryFS(VirtualFileSystem):
 
     def stat(self, path: str) -> FileStat:
         path = _normalize(path)
-        if path == "":
-            return FileStat(type="dir", size=len(self.readdir("")))
         if path in self._files:
             return FileStat(type="file", size=len(self._files[path]))
-        if self._is_dir(path):
-            return FileStat(type="dir", size=len(self.readdir(path)))
+        children = self._children.get(path)
+        if children is not None:
+            return FileStat(type="dir", size=len(children))
         raise FileNotFoundError(path)
 
     def readdir(self, path: str) -> list[DirEntry]:
-        path = _normalize(path)
-        prefix = f"{path}/" if path else ""
-        seen: dict[str, str] = {}  # name -> type
-
-        for fpath in self._files:
-            if not fpath.startswith(prefix):
-                continue
-            rest = fpath[len(prefix):]
-            if not rest:
-                continue
-            parts = rest.split("/")
-            name = parts[0]
-            if name not in seen:
-                seen[name] = "dir" if len(parts) > 1 else "file"
-            elif len(parts) > 1:
-                # If we see a deeper path, it must be a directory
-                pass  # already "dir" or "file" — if "file" then there's a conflict, prefer dir
-            # A name that appears both as file and prefix of deeper paths: treat as dir
-
-        return [DirEntry(name=n, type=t) for n, t in seen.items()]
+        children = self._children.get(_normalize(path), {})
+        return [DirEntry(name=n, type=t) for n, t in children.items()]
 
     def _is_dir(self, path: str) -> bool:
         """Check if path is an implicit directory (prefix of any file)."""
-        prefix = f"{path}/"
-        return any(f.startswith(prefix) for f in self._files)
+        return path != "" and path in self._children
+
+    def _index(self, path: str) -> None:
+        """Link a normalized file path and its ancestors into the dir index.
+
+        A name that is both a file and a prefix of deeper paths is listed
+        as a directory.
+        """
+        parent, _, name = path.rpartition("/")
+        self._children.setdefault(parent, {}).setdefault(name, "file")
+        while parent:
+            path = parent
+            parent, _, name = path.rpartition("/")
+            siblings = self._children.setdefault(parent, {})
+            if siblings.get(name) == "dir":
+                break  # ancestors above are already linked
+            siblings[name] = "dir"
+            self._children.setdefault(path, {})
 
     def _to_flat_files(self) -> dict[str, bytes]:
-        """Optimized: we already have the flat dict."""
-        return dict(self._files)
+        """Optimized: we already have the flat dict.
+
+        A read-only instance can never change it, so it is returned as-is
+        rather than copied; callers must treat the result as read-only.
+        """
+        return dict(self._files) if self._writable else self._files
+
+    def _to_encoded_files(self) -> dict[str, str]:
+        """Return the files encoded for RPC, so re-mounting skips base64."""
+        if self._encoded is None:
+            self._encoded = _encode_files_for_rpc(self._files)
+        return self._encoded
 
 
+@lru_cache(maxsize=4096)
 def _normalize(path: str) -> str:
     """Normalize a relative path: strip leading/trailing slashes, collapse dots."""
+    if (
+        path[:1] != "/"
+        and path[-1:] != "/"
+        and "//" not in path
+        and "./" not in path
+        and path != "."
+        and not path.endswith("/.")
+    ):
+        # Already normalized (the common case for keys and lookups).
+        return path
     parts = [p for p in path.split("/") if p and p != "."]
     return "/".join(parts)
 
 
 def _encode_files_for_rpc(files: dict[str, bytes]) -> dict[str, str]:
     """Encode a flat file dict to base64 for JSON-RPC transport."""
-    return {k: base64.b64encode(v).decode("ascii") for k, v in files.items()}
+    # Same encoding as _rpc._encode_bytes, inlined: for mounts of many small
+    # files the per-file helper call is a measurable share of the work.
+    # Empty files (e.g. package __init__.py) are common in mounts.
+    b2a = binascii.b2a_base64
+    return {k: b2a(v, newline=False).decode("ascii") if v else "" for k, v in files.items()}
@@ -1,11 +1,51 @@
 import shutil
 
+import pytest
+
 
 def pytest_collection_modifyitems(config, items):
     """Skip all tests if Deno is not available."""
     if shutil.which("deno") is None:
-        import pytest
-
         skip = pytest.mark.skip(reason="Deno not found on PATH")
         for item in items:
             item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def sandbox_pool():
+    """Warm default sandboxes, each paired with a snapshot of its fresh state.
+
+    Spawning the server dominates the cost of a short test, so the
+    ``sandbox`` fixture borrows from here instead of starting a new one.
+    Pinned to the Deno server: its snapshot restore resets env as well as
+    the VFS, while codepod-server's restores only the VFS, which would let
+    env set by one test leak into the next.
+    """
+    from codepod import Sandbox
+
+    def new() -> tuple[Sandbox, str]:
+        sbx = Sandbox(engine="deno")
+        return sbx, sbx.snapshot()
+
+    idle: list = []
+    yield idle, new
+    for sbx, _ in idle:
+        sbx.kill()
+
+
+@pytest.fixture
+def sandbox(sandbox_pool):
+    """A default Deno-backed Sandbox, restored to its fresh state after the test.
+
+    Tests that need their own server (custom options, several sandboxes,
+    kill) should construct ``Sandbox()`` directly.
+    """
+    idle, new = sandbox_pool
+    sbx, fresh = idle.pop() if idle else new()
+    yield sbx
+    try:
+        sbx.restore(fresh)
+    except Exception:
+        sbx.kill()
+    else:
+        idle.append((sbx, fresh))
@@ -1,13 +1,3 @@
-import pytest
-from codepod import Sandbox
-
-
-@pytest.fixture
-def sandbox():
-    with Sandbox() as sbx:
-        yield sbx
-
-
 class TestCommands:
     def test_echo(self, sandbox):
         result = sandbox.commands.run("echo hello")
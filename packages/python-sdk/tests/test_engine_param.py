@@ -1,6 +1,9 @@
+import re
 import pytest
 from unittest.mock import patch, MagicMock
-from codepod.sandbox import Sandbox, _find_codepod_server, _find_deno  # type: ignore[reportAttributeAccessIssue]
+from codepod.sandbox import Sandbox, _cache_found, _find_codepod_server, _find_deno  # type: ignore[reportAttributeAccessIssue]
+
+SERVER_NOT_FOUND = re.compile("codepod-server not found")
 
 
 def test_find_deno_returns_path_or_none():
@@ -14,6 +17,15 @@ def test_find_codepod_server_returns_path_or_none():
     assert result is None or isinstance(result, str)
 
 
+def test_binary_lookup_caches_only_hits():
+    answers = [None, "/opt/deno", "/other/deno"]
+    find = _cache_found(lambda: answers.pop(0))
+    assert find() is None
+    assert find() == "/opt/deno"
+    assert find() == "/opt/deno"
+    assert answers == ["/other/deno"]
+
+
 def test_sandbox_engine_auto_prefers_wasmtime(monkeypatch):
     """With engine='auto', should prefer wasmtime if codepod-server is on PATH."""
     calls = []
@@ -61,7 +73,7 @@ def test_sandbox_engine_wasmtime_raises_if_not_found(monkeypatch):
     monkeypatch.setattr("codepod.sandbox._find_codepod_server", lambda: None)
     monkeypatch.setattr("codepod.sandbox._is_bundled", lambda: False)
 
-    with pytest.raises(RuntimeError, match="codepod-server not found"):
+    with pytest.raises(RuntimeError, match=SERVER_NOT_FOUND):
         Sandbox(engine='wasmtime')
 
 
@@ -4,6 +4,8 @@ Tests the full round-trip: Python host registers extension -> sandbox runs it
 -> handler called -> result returned.
 """
 import json
+import threading
+
 import pytest
 from codepod import Sandbox, Extension, PythonPackage
 
@@ -61,6 +63,66 @@ class TestExtensionCommands:
             assert "/usr/bin/myext" in result.stdout
 
 
+class TestExtensionCallbacks:
+    """Sync handlers run off the reader thread, beside other RPC traffic."""
+
+    def test_handler_calls_back_into_sandbox(self):
+        def cat_host(args, stdin, env, cwd):
+            data = sbx.files.read(args[0])
+            return {"stdout": data.decode(), "exitCode": 0}
+
+        ext = Extension(name="cathost", command=cat_host)
+        with Sandbox(extensions=[ext]) as sbx:
+            sbx.files.write("/tmp/in.txt", "via the host")
+            result = sbx.commands.run("cathost /tmp/in.txt")
+            assert result.exit_code == 0
+            assert result.stdout == "via the host"
+
+    def test_slow_handler_does_not_block_other_calls(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def slow(args, stdin, env, cwd):
+            entered.set()
+            release.wait(timeout=30)
+            return {"stdout": "done\n", "exitCode": 0}
+
+        ext = Extension(name="slow", command=slow)
+        with Sandbox(extensions=[ext]) as sbx:
+            results = []
+            runner = threading.Thread(target=lambda: results.append(sbx.commands.run("slow")))
+            runner.start()
+            try:
+                assert entered.wait(timeout=30)
+                sbx.files.write("/tmp/meanwhile.txt", b"ok")
+                assert sbx.files.read("/tmp/meanwhile.txt") == b"ok"
+            finally:
+                release.set()
+                runner.join(timeout=30)
+            assert results[0].stdout.strip() == "done"
+
+    def test_pending_call_fails_when_server_exits(self):
+        entered = threading.Event()
+        release = threading.Event()
+
+        def block(args, stdin, env, cwd):
+            entered.set()
+            release.wait(timeout=30)
+            return {"stdout": "", "exitCode": 0}
+
+        ext = Extension(name="block", command=block)
+        sbx = Sandbox(extensions=[ext])
+        try:
+            pending = sbx._client.call_async("run", {"command": "block"})
+            assert entered.wait(timeout=30)
+            sbx._client._proc.kill()
+            with pytest.raises(RuntimeError, match="Server closed connection"):
+                pending.result(timeout=30)
+        finally:
+            release.set()
+            sbx.kill()
+
+
 class TestExtensionPythonPackages:
     def test_pip_list_shows_package(self):
         ext = Extension(
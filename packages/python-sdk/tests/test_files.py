@@ -1,14 +1,10 @@
+import errno
+from operator import attrgetter
 import pytest
-from codepod import Sandbox, FileInfo
+from codepod import FileInfo
 from codepod._rpc import RpcError
 
 
-@pytest.fixture
-def sandbox():
-    with Sandbox() as sbx:
-        yield sbx
-
-
 class TestFiles:
     def test_write_bytes_and_read(self, sandbox):
         sandbox.files.write("/tmp/test.bin", b"\x00\x01\x02\xff")
@@ -20,11 +16,19 @@ class TestFiles:
         content = sandbox.files.read("/tmp/msg.txt")
         assert content == b"hello world"
 
+    def test_write_many(self, sandbox):
+        sandbox.files.write_many({
+            "/tmp/one.txt": "first",
+            "/tmp/two.bin": b"\x00second",
+        })
+        assert sandbox.files.read("/tmp/one.txt") == b"first"
+        assert sandbox.files.read("/tmp/two.bin") == b"\x00second"
+
     def test_list(self, sandbox):
         sandbox.files.write("/tmp/a.txt", b"aaa")
         sandbox.files.write("/tmp/b.txt", b"bbb")
         entries = sandbox.files.list("/tmp")
-        names = {e.name for e in entries}
+        names = set(map(attrgetter("name"), entries))
         assert "a.txt" in names
         assert "b.txt" in names
         assert all(isinstance(e, FileInfo) for e in entries)
@@ -39,7 +43,7 @@ class TestFiles:
         sandbox.files.rm("/tmp/del.txt")
         with pytest.raises(RpcError) as exc_info:
             sandbox.files.read("/tmp/del.txt")
-        assert "ENOENT" in str(exc_info.value)
+        assert exc_info.value.errno == errno.ENOENT
 
     def test_stat_file(self, sandbox):
         sandbox.files.write("/tmp/sized.txt", b"12345")
@@ -52,4 +56,4 @@ class TestFiles:
         with pytest.raises(RpcError) as exc_info:
             sandbox.files.read("/tmp/nope.txt")
         assert exc_info.value.code == 1
-        assert "ENOENT" in exc_info.value.message
+        assert exc_info.value.errno == errno.ENOENT
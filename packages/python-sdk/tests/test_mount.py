@@ -1,6 +1,9 @@
 """Integration tests for mount and PYTHONPATH support."""
 
+from unittest.mock import MagicMock
+
 from codepod import Sandbox, MemoryFS
+from codepod.files import Files
 
 
 class TestMount:
@@ -41,6 +44,25 @@ class TestMount:
             assert result.exit_code == 0
             assert result.stdout == "# Hello"
 
+    def test_mount_many(self):
+        """Several mounts can be installed in one pipelined batch."""
+        with Sandbox() as sb:
+            sb.mount_many([
+                ("/mnt/a", {"a.txt": b"from a"}),
+                ("/mnt/b", MemoryFS({"b.txt": "from b"})),
+            ])
+            result = sb.commands.run("cat /mnt/a/a.txt /mnt/b/b.txt")
+            assert result.exit_code == 0
+            assert result.stdout == "from afrom b"
+
+    def test_stat_mounted_file(self):
+        """stat of a mounted file agrees before and after the local cache is dropped."""
+        with Sandbox(mounts=[("/mnt/tools", {"a.txt": b"abc"})]) as sb:
+            info = sb.files.stat("/mnt/tools/a.txt")
+            assert (info.name, info.type, info.size) == ("a.txt", "file", 3)
+            sb.commands.run("true")
+            assert sb.files.stat("/mnt/tools/a.txt") == info
+
     def test_ls_mount_point(self):
         """ls on a mount point lists its contents."""
         with Sandbox(mounts=[
@@ -118,3 +140,28 @@ class TestPythonPath:
             result = sb.commands.run("printenv PYTHONPATH")
             assert result.exit_code == 0
             assert "/mnt/libs" in result.stdout
+
+
+class TestMountStatCache:
+    """stat() answers for mounted files locally, under the paths the server uses."""
+
+    def _files(self, path, flat):
+        client = MagicMock()
+        client.call.return_value = {"name": "x", "type": "file", "size": 99}
+        files = Files(client)
+        files._cache_mount(path, flat)
+        return files, client
+
+    def test_leading_slash_stays_under_mount_point(self):
+        files, client = self._files("/mnt/x", {"/a.txt": b"abc", "./d//b.txt": b"b"})
+        assert files.stat("/mnt/x/a.txt").size == 3
+        assert files.stat("/mnt/x/d/b.txt").size == 1
+        client.call.assert_not_called()
+        files.stat("/a.txt")
+        client.call.assert_called_once()
+
+    def test_dotdot_keys_are_not_cached(self):
+        files, client = self._files("/mnt/y", {"d/../b.txt": b"b"})
+        assert files._mounted == {}
+        assert files.stat("/mnt/y/b.txt").size == 99
+        client.call.assert_called_once()
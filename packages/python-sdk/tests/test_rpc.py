@@ -1,8 +1,18 @@
+import errno
+import io
+import json
 import os
 import shutil
 import subprocess
+import threading
+from collections import deque
+from concurrent.futures import Future
+from types import SimpleNamespace
+
 import pytest
-from codepod._rpc import RpcClient, RpcError
+from codepod._rpc import (
+    RpcClient, RpcError, _ENCODE_CHUNK, _MAX_FRAME, _encode_bytes,
+)
 
 SERVER_SCRIPT = os.path.join(
     os.path.dirname(__file__), "..", "..", "sdk-server", "src", "server.ts"
@@ -19,24 +29,23 @@ ORCHESTRATOR_DIR = os.path.join(
 ORCHESTRATOR_NODE_ADAPTER = os.path.join(
     ORCHESTRATOR_DIR, "dist", "node-adapter.js"
 )
+RUNTIME = shutil.which("deno")
 
 
 def _ensure_orchestrator_build() -> None:
     if os.path.exists(ORCHESTRATOR_NODE_ADAPTER):
         return
-    runtime = shutil.which("deno")
-    assert runtime is not None, "Deno not found on PATH"
-    subprocess.run([runtime, "task", "build"], cwd=ORCHESTRATOR_DIR, check=True)
+    assert RUNTIME is not None, "Deno not found on PATH"
+    subprocess.run([RUNTIME, "task", "build"], cwd=ORCHESTRATOR_DIR, check=True)
 
 
 @pytest.fixture
 def client():
     """Start RPC client, create sandbox, yield client, kill on teardown."""
-    runtime = shutil.which("deno")
-    assert runtime is not None, "Deno not found on PATH"
+    assert RUNTIME is not None, "Deno not found on PATH"
     _ensure_orchestrator_build()
     server_args = ["run", "-A", "--no-check", "--unstable-sloppy-imports", SERVER_SCRIPT]
-    c = RpcClient(runtime, server_args)
+    c = RpcClient(RUNTIME, server_args)
     c.start()
     result = c.call("create", {"wasmDir": WASM_DIR, "shellWasmPath": SHELL_WASM})
     assert result["ok"] is True
@@ -61,13 +70,271 @@ class TestRpcClient:
         result = client.call("files.read", {"path": "/tmp/test.txt"})
         assert base64.b64decode(result["data"]) == b"test data"
 
+    def test_call_async_pipelines_requests(self, client):
+        import base64
+        writes = [
+            client.call_async("files.write", {
+                "path": f"/tmp/async{i}.txt",
+                "data": base64.b64encode(b"x" * i).decode(),
+            })
+            for i in range(8)
+        ]
+        assert all(w.result()["ok"] is True for w in writes)
+        reads = [client.call_async("files.read", {"path": f"/tmp/async{i}.txt"}) for i in range(8)]
+        missing = client.call_async("files.read", {"path": "/nonexistent"})
+        assert [base64.b64decode(r.result()["data"]) for r in reads] == [b"x" * i for i in range(8)]
+        with pytest.raises(RpcError):
+            missing.result()
+
+        listed = client.call_async("files.list", {"path": "/tmp"})
+        stat = client.call_async("files.stat", {"path": "/tmp/async3.txt"})
+        assert "async3.txt" in {e["name"] for e in listed.result()["entries"]}
+        assert stat.result()["size"] == 3
+
+    def test_streamed_output_with_concurrent_caller(self, client):
+        """Output reaches the right handler while another thread is issuing calls."""
+        stop = threading.Event()
+
+        def background():
+            while not stop.is_set():
+                client.call("files.stat", {"path": "/tmp"})
+
+        t = threading.Thread(target=background)
+        t.start()
+        try:
+            for i in range(50):
+                chunks: list[str] = []
+                client.call(
+                    "run", {"command": f"echo run{i}", "stream": True},
+                    on_stdout=chunks.append,
+                )
+                assert "".join(chunks).strip() == f"run{i}"
+        finally:
+            stop.set()
+            t.join()
+
+    def test_output_handler_calls_back_into_client(self, client):
+        import base64
+        client.call(
+            "run", {"command": "echo relayed", "stream": True},
+            on_stdout=lambda data: client.call("files.write", {
+                "path": "/tmp/relayed.txt", "data": base64.b64encode(data.encode()).decode(),
+            }),
+        )
+        result = client.call("files.read", {"path": "/tmp/relayed.txt"})
+        assert base64.b64decode(result["data"]).strip() == b"relayed"
+
+    def test_oversized_request_fails_alone(self, client):
+        import base64
+        small = client.call_async("files.write", {"path": "/tmp/small.txt", "data": base64.b64encode(b"ok").decode()})
+        with pytest.raises(RpcError, match="Request too large"):
+            client.call("files.write", {"path": "/tmp/big.txt", "data": "A" * (_MAX_FRAME + 4)})
+        assert small.result()["ok"] is True
+
+    def test_aborted_upload_then_call(self, client):
+        with pytest.raises(OSError, match="source failed"):
+            client.call_with_upload(
+                "persistence.import", {}, "data", ShortReads(b"x" * 300_000, 4096, fail_after=100_000),
+            )
+        assert client.call("run", {"command": "echo still fine"})["stdout"].strip() == "still fine"
+
     def test_method_not_found(self, client):
         with pytest.raises(RpcError) as exc_info:
             client.call("nonexistent", {})
         assert exc_info.value.code == -32601
+        assert exc_info.value.errno is None
 
     def test_sandbox_error(self, client):
         with pytest.raises(RpcError) as exc_info:
             client.call("files.read", {"path": "/nonexistent"})
         assert exc_info.value.code == 1
+        assert exc_info.value.errno == errno.ENOENT
         assert "ENOENT" in exc_info.value.message
+
+
+def _replay(
+    pending: dict[int, Future], *messages: dict, unattributed=(), handlers=None,
+) -> None:
+    """Feed server messages to a client's reader loop, then EOF."""
+    c = RpcClient("unused", [])
+    c._pending = pending
+    c._unattributed = deque(unattributed)
+    c._output_handlers = handlers or {}
+    c._read_loop(io.BytesIO(b"".join(json.dumps(m).encode() + b"\n" for m in messages)))
+
+
+def _output(request_id: int, data: str) -> dict:
+    return {"jsonrpc": "2.0", "method": "output", "params": {
+        "request_id": request_id, "stream": "stdout", "data": data,
+    }}
+
+
+def _ok(request_id: int) -> dict:
+    return {"jsonrpc": "2.0", "id": request_id, "result": {"ok": True}}
+
+
+TOO_LARGE = {"jsonrpc": "2.0", "id": 0, "error": {"code": -32700, "message": "Request too large"}}
+
+
+class TestReadLoop:
+    def test_unattributed_error_goes_to_sole_request(self):
+        only: Future = Future()
+        _replay({1: only}, TOO_LARGE)
+        with pytest.raises(RpcError, match="Request too large"):
+            only.result()
+
+    def test_unattributed_error_goes_to_the_frame_that_drew_it(self):
+        """With several requests out, the others keep their own outcomes."""
+        small, oversized = Future(), Future()
+        _replay({1: small, 2: oversized}, TOO_LARGE, _ok(1), unattributed=[2])
+        assert small.result() == {"ok": True}
+        with pytest.raises(RpcError, match="Request too large"):
+            oversized.result()
+
+    def test_unattributed_error_otherwise_goes_to_oldest_request(self):
+        first, second = Future(), Future()
+        _replay({1: first, 2: second}, TOO_LARGE, _ok(2))
+        with pytest.raises(RpcError, match="Request too large"):
+            first.result()
+        assert second.result() == {"ok": True}
+
+    def test_unknown_id_is_not_given_to_another_request(self):
+        waiting: Future = Future()
+        _replay({2: waiting}, {"jsonrpc": "2.0", "id": 7, "result": {"ok": True}})
+        with pytest.raises(RuntimeError, match="Server closed connection"):
+            waiting.result()
+
+
+class ShortReads(io.RawIOBase):
+    """A raw source that returns at most ``step`` bytes per read, like a pipe."""
+
+    def __init__(self, data: bytes, step: int = 7, fail_after: int | None = None):
+        self._data = memoryview(data)
+        self._pos = 0
+        self._step = step
+        self._fail_after = fail_after
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        if self._fail_after is not None and self._pos >= self._fail_after:
+            raise OSError("source failed")
+        n = min(len(buf), self._step, len(self._data) - self._pos)
+        buf[:n] = self._data[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+
+def _offline_client() -> RpcClient:
+    """A client whose requests are written to memory instead of a server."""
+    c = RpcClient("unused", [])
+    c._proc = SimpleNamespace(stdin=io.BytesIO(), stdout=io.BytesIO())
+    return c
+
+
+class TestUpload:
+    @pytest.mark.parametrize("params", [{}, {"sandboxId": "s1"}])
+    @pytest.mark.parametrize("size", [0, 1, _ENCODE_CHUNK, _ENCODE_CHUNK + 2])
+    def test_frame_matches_inline_encoding(self, params, size):
+        raw = os.urandom(size)
+        c = _offline_client()
+        c._send_request("persistence.import", params, upload=("data", io.BytesIO(raw)))
+        line = c._proc.stdin.getvalue()
+        assert line.count(b"\n") == 1 and line.endswith(b"\n")
+        msg = json.loads(line)
+        assert msg["id"] == 1
+        assert msg["method"] == "persistence.import"
+        assert msg["params"] == {**params, "data": _encode_bytes(raw)}
+
+    @pytest.mark.parametrize("step", [1, 2, 4, 7])
+    def test_short_reads_encode_without_inner_padding(self, step):
+        raw = os.urandom(1000)
+        c = _offline_client()
+        c._send_request("persistence.import", {}, upload=("data", ShortReads(raw, step)))
+        assert json.loads(c._proc.stdin.getvalue())["params"]["data"] == _encode_bytes(raw)
+
+    def test_aborted_upload_does_not_fail_the_next_call(self):
+        c = _offline_client()
+        with pytest.raises(OSError, match="source failed"):
+            c._send_request(
+                "persistence.import", {}, upload=("data", ShortReads(b"x" * 100, fail_after=50)),
+            )
+        assert c._proc.stdin.getvalue().endswith(b"\n")
+        following = c.call_async("files.stat", {"path": "/tmp"})
+        parse_error = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "Parse error"}}
+        c._read_loop(io.BytesIO(b"".join(
+            json.dumps(m).encode() + b"\n" for m in (parse_error, _ok(2))
+        )))
+        assert following.result() == {"ok": True}
+
+    def test_oversized_upload_stops_early(self):
+        c = _offline_client()
+        with pytest.raises(RpcError, match="Request too large"):
+            c._send_request("persistence.import", {}, upload=("data", io.BytesIO(bytes(_MAX_FRAME))))
+        written = c._proc.stdin.getvalue()
+        assert written.endswith(b"\n") and len(written) < _MAX_FRAME + (1 << 20)
+        assert list(c._unattributed) == [1]
+
+
+class TestOutputHandlers:
+    def test_run_in_order_before_the_response(self):
+        seen: list[str] = []
+        done: Future = Future()
+        _replay(
+            {1: done},
+            _output(1, "a"), _output(1, "b"), _output(1, "c"), _ok(1),
+            handlers={1: {"stdout": seen.append}},
+        )
+        assert done.result(timeout=5) == {"ok": True}
+        assert seen == ["a", "b", "c"]
+
+    def test_handler_does_not_block_the_reader(self):
+        """A handler may wait on a response that arrives after its output."""
+        streaming, other = Future(), Future()
+        _replay(
+            {1: streaming, 2: other},
+            _output(1, "x"), _ok(2), _ok(1),
+            handlers={1: {"stdout": lambda data: other.result(timeout=5)}},
+        )
+        assert streaming.result(timeout=5) == {"ok": True}
+
+    def test_raising_handler_fails_only_its_request(self):
+        def boom(data):
+            raise ValueError("handler failed")
+
+        streaming, other = Future(), Future()
+        _replay(
+            {1: streaming, 2: other},
+            _output(1, "x"), _ok(1), _ok(2),
+            handlers={1: {"stdout": boom}},
+        )
+        with pytest.raises(ValueError, match="handler failed"):
+            streaming.result(timeout=5)
+        assert other.result(timeout=5) == {"ok": True}
+
+
+def test_failed_batch_flushes_and_forgets_its_requests():
+    c = _offline_client()
+    sent = io.BytesIO()
+    c._proc.stdin = io.BufferedWriter(sent)
+
+    def calls():
+        yield "files.stat", {"path": "/a"}
+        yield "files.stat", {"path": "/b"}
+        raise ValueError("generator failed")
+
+    with pytest.raises(ValueError, match="generator failed"):
+        c.call_batch(calls())
+    assert sent.getvalue().count(b"\n") == 2
+    assert c._pending == {}
+
+
+def test_oversized_frame_is_refused_before_sending():
+    c = RpcClient("unused", [])
+    c._proc = SimpleNamespace(stdin=io.BytesIO(), stdout=io.BytesIO())
+    with pytest.raises(RpcError, match="Request too large") as exc_info:
+        c.call_async("files.write", {"data": "A" * _MAX_FRAME})
+    assert exc_info.value.code == -32700
+    assert c._proc.stdin.getvalue() == b""
+    assert c._pending == {}
@@ -1,6 +1,11 @@
+import errno
+import re
+from operator import attrgetter
 import pytest
 from codepod import Sandbox
 
+NOT_ON_PATH = re.compile("found on PATH")
+
 
 class TestSandbox:
     def test_create_and_kill(self):
@@ -16,7 +21,7 @@ class TestSandbox:
         monkeypatch.setattr("codepod.sandbox._find_codepod_server", lambda: None)
         monkeypatch.setattr("codepod.sandbox._find_deno", lambda: None)
         monkeypatch.setattr("codepod.sandbox._is_bundled", lambda: False)
-        with pytest.raises(RuntimeError, match="found on PATH"):
+        with pytest.raises(RuntimeError, match=NOT_ON_PATH):
             Sandbox()
 
 
@@ -29,71 +34,64 @@ class TestSandboxEndToEnd:
     correctly through all layers.
     """
 
-    def test_write_file_then_cat(self):
+    def test_write_file_then_cat(self, sandbox):
         """Write a file via the Files API, then read it back via a shell command."""
-        with Sandbox() as sbx:
-            sbx.files.write("/tmp/input.txt", "hello from python")
-            result = sbx.commands.run("cat /tmp/input.txt")
-            assert result.exit_code == 0
-            assert result.stdout == "hello from python"
+        sandbox.files.write("/tmp/input.txt", "hello from python")
+        result = sandbox.commands.run("cat /tmp/input.txt")
+        assert result.exit_code == 0
+        assert result.stdout == "hello from python"
 
-    def test_command_output_to_file(self):
+    def test_command_output_to_file(self, sandbox):
         """Use a shell redirect to write output, then read via Files API."""
-        with Sandbox() as sbx:
-            sbx.commands.run("echo generated > /tmp/out.txt")
-            content = sbx.files.read("/tmp/out.txt")
-            assert b"generated" in content
+        sandbox.commands.run("echo generated > /tmp/out.txt")
+        content = sandbox.files.read("/tmp/out.txt")
+        assert b"generated" in content
 
-    def test_multiple_commands_sequential(self):
+    def test_multiple_commands_sequential(self, sandbox):
         """Run multiple commands sequentially and verify cumulative effects."""
-        with Sandbox() as sbx:
-            sbx.files.write("/tmp/multi.txt", "line1\n")
-            sbx.commands.run("echo line2 >> /tmp/multi.txt")
-            result = sbx.commands.run("cat /tmp/multi.txt")
-            assert "line1" in result.stdout
-            assert "line2" in result.stdout
+        sandbox.files.write("/tmp/multi.txt", "line1\n")
+        sandbox.commands.run("echo line2 >> /tmp/multi.txt")
+        result = sandbox.commands.run("cat /tmp/multi.txt")
+        assert "line1" in result.stdout
+        assert "line2" in result.stdout
 
-    def test_env_variable_persistence(self):
+    def test_env_variable_persistence(self, sandbox):
         """Set an env variable via assignment and read it back in a later command."""
-        with Sandbox() as sbx:
-            sbx.commands.run("MY_VAR=hello_world")
-            result = sbx.commands.run("echo $MY_VAR")
-            assert result.stdout.strip() == "hello_world"
+        sandbox.commands.run("MY_VAR=hello_world")
+        result = sandbox.commands.run("echo $MY_VAR")
+        assert result.stdout.strip() == "hello_world"
 
-    def test_write_read_roundtrip_binary(self):
+    def test_write_read_roundtrip_binary(self, sandbox):
         """Write binary data via Files API and read it back, verifying full roundtrip."""
-        with Sandbox() as sbx:
-            data = bytes(range(256))
-            sbx.files.write("/tmp/binary.bin", data)
-            read_back = sbx.files.read("/tmp/binary.bin")
-            assert read_back == data
+        data = bytes(range(256))
+        sandbox.files.write("/tmp/binary.bin", data)
+        read_back = sandbox.files.read("/tmp/binary.bin")
+        assert read_back == data
 
-    def test_mkdir_write_list_stat_rm_lifecycle(self):
+    def test_mkdir_write_list_stat_rm_lifecycle(self, sandbox):
         """Full file lifecycle: mkdir -> write -> list -> stat -> rm -> verify gone."""
-        with Sandbox() as sbx:
-            sbx.files.mkdir("/tmp/project")
-            sbx.files.write("/tmp/project/data.txt", "content")
+        sandbox.files.mkdir("/tmp/project")
+        sandbox.files.write("/tmp/project/data.txt", "content")
 
-            entries = sbx.files.list("/tmp/project")
-            names = [e.name for e in entries]
-            assert "data.txt" in names
+        entries = sandbox.files.list("/tmp/project")
+        names = set(map(attrgetter("name"), entries))
+        assert "data.txt" in names
 
-            info = sbx.files.stat("/tmp/project/data.txt")
-            assert info.type == "file"
-            assert info.size == 7  # len("content")
+        info = sandbox.files.stat("/tmp/project/data.txt")
+        assert info.type == "file"
+        assert info.size == 7  # len("content")
 
-            sbx.files.rm("/tmp/project/data.txt")
-            entries_after = sbx.files.list("/tmp/project")
-            names_after = [e.name for e in entries_after]
-            assert "data.txt" not in names_after
+        sandbox.files.rm("/tmp/project/data.txt")
+        entries_after = sandbox.files.list("/tmp/project")
+        names_after = set(map(attrgetter("name"), entries_after))
+        assert "data.txt" not in names_after
 
-    def test_pipeline_with_file(self):
+    def test_pipeline_with_file(self, sandbox):
         """Write a multi-line file, then use a pipeline to process it."""
-        with Sandbox() as sbx:
-            sbx.files.write("/tmp/lines.txt", "aaa\nbbb\nccc\n")
-            result = sbx.commands.run("cat /tmp/lines.txt | wc -l")
-            assert result.exit_code == 0
-            assert result.stdout.strip() == "3"
+        sandbox.files.write("/tmp/lines.txt", "aaa\nbbb\nccc\n")
+        result = sandbox.commands.run("cat /tmp/lines.txt | wc -l")
+        assert result.exit_code == 0
+        assert result.stdout.strip() == "3"
 
     def test_multiple_sandboxes_isolated(self):
         """Two sandboxes have completely separate file systems."""
@@ -105,24 +103,23 @@ class TestSandboxEndToEnd:
 
                 with pytest.raises(RpcError) as exc_info:
                     sbx2.files.read("/tmp/only_in_1.txt")
-                assert "ENOENT" in exc_info.value.message
+                assert exc_info.value.errno == errno.ENOENT
 
-    def test_command_after_file_operations(self):
+    def test_command_after_file_operations(self, sandbox):
         """Verify commands work correctly after multiple file operations."""
-        with Sandbox() as sbx:
-            # Perform several file operations
-            sbx.files.mkdir("/tmp/workdir")
-            sbx.files.write("/tmp/workdir/a.txt", "alpha")
-            sbx.files.write("/tmp/workdir/b.txt", "bravo")
+        # Perform several file operations
+        sandbox.files.mkdir("/tmp/workdir")
+        sandbox.files.write("/tmp/workdir/a.txt", "alpha")
+        sandbox.files.write("/tmp/workdir/b.txt", "bravo")
 
-            # Then run a command that reads one of the files
-            result = sbx.commands.run("cat /tmp/workdir/a.txt")
-            assert result.stdout == "alpha"
+        # Then run a command that reads one of the files
+        result = sandbox.commands.run("cat /tmp/workdir/a.txt")
+        assert result.stdout == "alpha"
 
-            # List via command
-            result = sbx.commands.run("ls /tmp/workdir")
-            assert "a.txt" in result.stdout
-            assert "b.txt" in result.stdout
+        # List via command
+        result = sandbox.commands.run("ls /tmp/workdir")
+        assert "a.txt" in result.stdout
+        assert "b.txt" in result.stdout
 
     def test_export_import_roundtrip(self):
         """Export state, overwrite data, import, and verify restoration."""
@@ -134,3 +131,28 @@ class TestSandboxEndToEnd:
             sbx.import_state(blob)
             content = sbx.files.read("/tmp/persist.txt")
             assert content == b"persisted data"
+
+    def test_snapshot_reused_until_state_changes(self):
+        """An unchanged sandbox hands back the previous snapshot ID."""
+        with Sandbox() as sbx:
+            first = sbx.snapshot()
+            assert sbx.snapshot() == first
+            sbx.files.write("/tmp/changed.txt", b"x")
+            second = sbx.snapshot()
+            assert second != first
+            sbx.restore(first)
+            assert sbx.snapshot() == first
+            assert sbx.snapshot(force=True) != first
+
+    def test_export_state_to_sink(self):
+        """State round-trips through a file-like sink and source."""
+        import io
+
+        with Sandbox() as sbx:
+            sbx.files.write("/tmp/persist.txt", b"persisted data")
+            sink = io.BytesIO()
+            assert sbx.export_state(sink) is None
+            sink.seek(0)
+            with Sandbox() as sbx2:
+                sbx2.import_state(sink)
+                assert sbx2.files.read("/tmp/persist.txt") == b"persisted data"
@@ -73,6 +73,14 @@ class TestMemoryFS:
         fs.write_file("new.txt", b"hello")
         assert fs.read_file("new.txt") == b"hello"
 
+    def test_write_file_creates_parent_dirs(self):
+        fs = MemoryFS({}, writable=True)
+        fs.write_file("a/b/c.txt", b"x")
+        assert fs.exists("a") is True
+        assert fs.exists("a/b") is True
+        assert fs.stat("a/b").type == "dir"
+        assert fs.exists("a/c") is False
+
     def test_write_file_readonly_raises(self):
         fs = MemoryFS({})
         try:
@@ -86,6 +94,22 @@ class TestMemoryFS:
         flat = fs._to_flat_files()
         assert flat == {"a.txt": b"a", "dir/b.txt": b"b"}
 
+    def test_to_flat_files_copies_only_when_writable(self):
+        ro = MemoryFS({"a.txt": b"a"})
+        assert ro._to_flat_files() is ro._to_flat_files()
+        rw = MemoryFS({"a.txt": b"a"}, writable=True)
+        flat = rw._to_flat_files()
+        rw.write_file("b.txt", b"b")
+        assert flat == {"a.txt": b"a"}
+
+    def test_to_encoded_files_reused_until_write(self):
+        fs = MemoryFS({"a.txt": b"a", "empty": b""}, writable=True)
+        encoded = fs._to_encoded_files()
+        assert encoded == {"a.txt": "YQ==", "empty": ""}
+        assert fs._to_encoded_files() is encoded
+        fs.write_file("a.txt", b"b")
+        assert fs._to_encoded_files() == {"a.txt": "Yg==", "empty": ""}
+
     def test_path_normalization(self):
         """Leading slashes and dots are stripped."""
         fs = MemoryFS({"./dir/file.txt": b"x"})